@@ -5,10 +5,38 @@ Using Google AI Studio / Vertex AI
 """
 
 import google.generativeai as genai
+import io
 import json
+import mmap
+import orjson
 import os
+import zstandard as zstd
 from typing import List, Dict
 
+def iter_jsonl(file_path: str):
+    """Yield records from a JSONL file via a memory-mapped view (streamed for .zst)"""
+    if file_path.endswith('.zst'):
+        with open(file_path, 'rb') as f:
+            reader = io.BufferedReader(zstd.ZstdDecompressor().stream_reader(f))
+            for line in reader:
+                if line.strip():
+                    yield orjson.loads(line)
+        return
+    
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start, size = 0, len(mm)
+            while start < size:
+                end = mm.find(b'\n', start)
+                if end == -1:
+                    end = size
+                if end > start:
+                    yield orjson.loads(mm[start:end])
+                start = end + 1
+
 class GeminiFinetuner:
     def __init__(self, api_key: str):
         genai.configure(api_key=api_key)
@@ -17,22 +45,17 @@ class GeminiFinetuner:
         """Convert JSONL to Gemini format"""
         training_data = []
         
-        with open(input_file, 'r') as f:
-            for line in f:
-                data = json.loads(line)
-                messages = data['messages']
-                
-                # Extract user and assistant messages
-                user_msg = next(m['content'] for m in messages if m['role'] == 'user')
-                assistant_msg = next(m['content'] for m in messages if m['role'] == 'assistant')
-                
-                training_data.append({
-                    "text_input": user_msg,
-                    "output": assistant_msg
-                })
+        for data in iter_jsonl(input_file):
+            # Extract user and assistant messages in a single pass
+            roles = {m['role']: m['content'] for m in data['messages']}
+            
+            training_data.append({
+                "text_input": roles['user'],
+                "output": roles['assistant']
+            })
         
-        with open(output_file, 'w') as f:
-            json.dump(training_data, f, indent=2)
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(training_data, option=orjson.OPT_INDENT_2))
         
         print(f"Converted {len(training_data)} examples for Gemini")
         return output_file
@@ -67,7 +90,119 @@ def create_ollama_finetune_script():
 echo "🔧 Setting up local fine-tuning environment..."
 
 # Install required packages
-pip install transformers datasets torch accelerate peft
+pip install transformers torch accelerate peft orjson zstandard mosaicml-streaming
+
+# Create preprocessing script: shard the JSONL corpus into MDS in parallel
+cat > convert_to_mds.py << 'EOF'
+import io
+import itertools
+import mmap
+import numpy as np
+import orjson
+import os
+import sys
+import zstandard as zstd
+from multiprocessing import Pool
+from streaming import MDSWriter
+from streaming.base.util import merge_index
+from transformers import AutoTokenizer
+
+# Conversations are stored pre-tokenized so training never re-tokenizes them
+COLUMNS = {"input_ids": "ndarray:int32"}
+MAX_LENGTH = 512
+BATCH_SIZE = 1000
+
+def iter_jsonl(file_path, start=0, end=None):
+    """Yield records whose lines start within [start, end) of a JSONL file (streamed for .zst)"""
+    if file_path.endswith('.zst'):
+        with open(file_path, 'rb') as f:
+            reader = io.BufferedReader(zstd.ZstdDecompressor().stream_reader(f))
+            for line in reader:
+                if line.strip():
+                    yield orjson.loads(line)
+        return
+    
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            end = size if end is None else end
+            while start < end:
+                stop = mm.find(b'\\n', start)
+                if stop == -1:
+                    stop = size
+                if stop > start:
+                    yield orjson.loads(mm[start:stop])
+                start = stop + 1
+
+def split_jsonl(file_path, num_chunks):
+    """Split a JSONL file into byte ranges that begin on line boundaries"""
+    size = os.path.getsize(file_path)
+    bounds = [0]
+    with open(file_path, 'rb') as f:
+        for i in range(1, num_chunks):
+            f.seek(size * i // num_chunks)
+            f.readline()
+            bounds.append(f.tell())
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def load_tokenizer(model_name):
+    """Load the tokenizer and tokenize the role tags spliced into every conversation"""
+    global tokenizer, ROLE_IDS, NL_IDS
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    tokenizer.add_special_tokens({"pad_token": "[PAD]"})
+    ROLE_IDS = {
+        role: tokenizer.encode(f"<|{role}|>\\n", add_special_tokens=False)
+        for role in ("system", "user", "assistant")
+    }
+    NL_IDS = tokenizer.encode("\\n", add_special_tokens=False)
+
+def encode_batch(conversations):
+    """Yield token IDs per conversation, encoding all message bodies in one fast-tokenizer call"""
+    contents = [msg['content'] for messages in conversations for msg in messages]
+    content_ids = iter(tokenizer(contents, add_special_tokens=False)["input_ids"])
+    
+    for messages in conversations:
+        ids = []
+        for msg in messages:
+            ids += ROLE_IDS[msg['role']]
+            ids += next(content_ids)
+            ids += NL_IDS
+        yield np.asarray(ids[:MAX_LENGTH], dtype=np.int32)
+
+def write_chunk(job):
+    """Tokenize one byte range of the corpus into its own MDS directory"""
+    file_path, start, end, out_dir = job
+    records = iter_jsonl(file_path, start, end)
+    with MDSWriter(out=out_dir, columns=COLUMNS, compression="zstd") as writer:
+        while batch := [record['messages'] for record in itertools.islice(records, BATCH_SIZE)]:
+            for ids in encode_batch(batch):
+                writer.write({"input_ids": ids})
+
+if __name__ == "__main__":
+    input_path, out_root = sys.argv[1], sys.argv[2]
+    # Must match model_name in train_svelte_model.py
+    model_name = sys.argv[3] if len(sys.argv) > 3 else "microsoft/DialoGPT-medium"
+    
+    # Compressed input cannot be split by byte offset, so it is converted in one job
+    if input_path.endswith('.zst'):
+        ranges = [(0, None)]
+    else:
+        ranges = split_jsonl(input_path, os.cpu_count())
+    
+    jobs = [
+        (input_path, start, end, os.path.join(out_root, f"part-{i:05d}"))
+        for i, (start, end) in enumerate(ranges)
+    ]
+    with Pool(max(1, len(jobs)), initializer=load_tokenizer, initargs=(model_name,)) as pool:
+        pool.map(write_chunk, jobs)
+    
+    # Merge the per-chunk indexes into a single dataset
+    merge_index(out_root, keep_local=True)
+    print(f"✅ Wrote {len(jobs)} MDS shard group(s) to {out_root}")
+EOF
 
 # Create training script
 cat > train_svelte_model.py << 'EOF'
@@ -79,87 +214,116 @@ from transformers import (
     Trainer,
     DataCollatorForLanguageModeling
 )
-from datasets import Dataset
-import json
+from peft import LoraConfig, TaskType, get_peft_model
+from streaming import LocalDataset
+import os
 
-def load_training_data(file_path):
-    """Load and format training data"""
-    data = []
-    with open(file_path, 'r') as f:
-        for line in f:
-            item = json.loads(line)
-            messages = item['messages']
-            
-            # Format as conversation
-            conversation = ""
-            for msg in messages:
-                role = msg['role']
-                content = msg['content']
-                conversation += f"<|{role}|>\\n{content}\\n"
-            
-            data.append({"text": conversation})
-    
-    return Dataset.from_list(data)
-
-# Load model and tokenizer
-model_name = "microsoft/DialoGPT-medium"  # Or any suitable base model
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForCausalLM.from_pretrained(model_name)
-
-# Add special tokens
-special_tokens = {"pad_token": "[PAD]"}
-tokenizer.add_special_tokens(special_tokens)
-model.resize_token_embeddings(len(tokenizer))
-
-# Load and tokenize data
-dataset = load_training_data("comprehensive-training.jsonl")
-
-def tokenize_function(examples):
-    return tokenizer(examples["text"], truncation=True, padding=True, max_length=512)
-
-tokenized_dataset = dataset.map(tokenize_function, batched=True)
-
-# Training arguments
-training_args = TrainingArguments(
-    output_dir="./svelte-inspect-model",
-    num_train_epochs=3,
-    per_device_train_batch_size=4,
-    gradient_accumulation_steps=2,
-    warmup_steps=100,
-    logging_steps=10,
-    save_steps=500,
-    evaluation_strategy="no",
-    save_total_limit=2,
-    prediction_loss_only=True,
-)
+class ConversationDataset(LocalDataset):
+    """Memory-mapped conversations pre-tokenized by convert_to_mds.py"""
+    def __getitem__(self, idx):
+        ids = super().__getitem__(idx)["input_ids"].tolist()
+        return {"input_ids": ids, "attention_mask": [1] * len(ids)}
 
-# Data collator
-data_collator = DataCollatorForLanguageModeling(
-    tokenizer=tokenizer,
-    mlm=False,
-)
+# Only the main process trains; dataloader workers started with spawn re-import
+# this module and must stop after the dataset class is defined
+if __name__ == "__main__":
+    # Load model and tokenizer
+    model_name = "microsoft/DialoGPT-medium"  # Or any suitable base model
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    tokenizer.model_max_length = 512
+    # bf16 needs Ampere or newer; older GPUs (T4/V100) fall back to fp16 mixed precision
+    # over fp32 weights, and CPU runs stay in fp32
+    use_bf16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    use_fp16 = torch.cuda.is_available() and not use_bf16
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        torch_dtype=torch.bfloat16 if use_bf16 else torch.float32,
+    )
 
-# Trainer
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    data_collator=data_collator,
-    train_dataset=tokenized_dataset,
-)
+    # Add special tokens
+    special_tokens = {"pad_token": "[PAD]"}
+    tokenizer.add_special_tokens(special_tokens)
+    model.resize_token_embeddings(len(tokenizer))
+
+    # Train low-rank adapters on the attention projections instead of all weights
+    lora_config = LoraConfig(
+        r=8,
+        lora_alpha=16,
+        target_modules=["c_attn"],
+        task_type=TaskType.CAUSAL_LM,
+    )
+    model = get_peft_model(model, lora_config)
+    model.print_trainable_parameters()
+
+    # Random-access view over the MDS shards written by convert_to_mds.py
+    tokenized_dataset = ConversationDataset(local="./mds-training-data")
 
-# Train
-print("🚀 Starting training...")
-trainer.train()
+    # Training arguments
+    training_args = TrainingArguments(
+        output_dir="./svelte-inspect-model",
+        num_train_epochs=3,
+        per_device_train_batch_size=4,
+        gradient_accumulation_steps=2,
+        warmup_steps=100,
+        logging_steps=10,
+        save_steps=500,
+        evaluation_strategy="no",
+        save_total_limit=2,
+        prediction_loss_only=True,
+        # Overlap batch preparation with GPU compute; under torchrun the CPUs are
+        # shared by every rank on the node
+        dataloader_num_workers=max(1, os.cpu_count() // (2 * int(os.environ.get("LOCAL_WORLD_SIZE", 1)))),
+        dataloader_pin_memory=True,
+        dataloader_prefetch_factor=4,
+        dataloader_persistent_workers=True,
+        # Mixed precision and activation checkpointing to cut memory
+        bf16=use_bf16,
+        fp16=use_fp16,
+        gradient_checkpointing=True,
+        gradient_checkpointing_kwargs={"use_reentrant": False},
+        # Settings used when launched under torchrun (DistributedDataParallel)
+        ddp_find_unused_parameters=False,
+        ddp_bucket_cap_mb=25,
+    )
 
-# Save model
-trainer.save_model("./svelte-inspect-fine-tuned")
-tokenizer.save_pretrained("./svelte-inspect-fine-tuned")
-print("✅ Model saved!")
+    # Data collator
+    data_collator = DataCollatorForLanguageModeling(
+        tokenizer=tokenizer,
+        mlm=False,
+    )
+
+    # Trainer
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        data_collator=data_collator,
+        train_dataset=tokenized_dataset,
+    )
+
+    # Train
+    print("🚀 Starting training...")
+    trainer.train()
+
+    # Save model with adapters merged into the base weights (once, from the main process)
+    if trainer.is_world_process_zero():
+        model.merge_and_unload().save_pretrained("./svelte-inspect-fine-tuned")
+        tokenizer.save_pretrained("./svelte-inspect-fine-tuned")
+        print("✅ Model saved!")
 
 EOF
 
+echo "📦 Tokenizing training data into MDS shards..."
+rm -rf ./mds-training-data
+python convert_to_mds.py comprehensive-training.jsonl ./mds-training-data
+
 echo "🎯 Running fine-tuning..."
-python train_svelte_model.py
+# Run one DDP process per GPU when any are available
+NUM_GPUS=$(nvidia-smi -L 2>/dev/null | wc -l)
+if [ "$NUM_GPUS" -gt 0 ]; then
+    torchrun --nproc_per_node="$NUM_GPUS" train_svelte_model.py
+else
+    python train_svelte_model.py
+fi
 
 echo "🔄 Converting to Ollama format..."
 # Convert to GGUF format for Ollama (requires additional tools)
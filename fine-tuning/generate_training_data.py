@@ -3,8 +3,14 @@
 Generate comprehensive training data for Svelte 5 $inspect fine-tuning
 """
 
-import json
+import itertools
+import orjson
 import random
+import sys
+import zstandard as zstd
+
+# Shared by every example; interned so all records reference a single string
+SYSTEM_PROMPT = sys.intern("You are an expert Svelte 5 developer. Always use proper JavaScript syntax including backticks for template literals.")
 
 # Base patterns that need to be learned correctly
 console_patterns = [
@@ -15,48 +21,41 @@ console_patterns = [
     "Counter is now: ${count}",
 ]
 
-# Template for generating training examples
-def generate_training_example(pattern, task_description):
-    wrong_pattern = pattern.replace('`', '')  # Remove backticks (common error)
-    
-    return {
-        "messages": [
-            {
-                "role": "system", 
-                "content": "You are an expert Svelte 5 developer. Always use proper JavaScript syntax including backticks for template literals."
-            },
-            {
-                "role": "user", 
-                "content": f"Create $inspect with console.log that {task_description}"
-            },
-            {
-                "role": "assistant", 
-                "content": f"""<svelte:options runes={{true}} />
+# Message templates, filled with C-level %-formatting per example
+USER_TEMPLATE = "Create $inspect with console.log that %s"
+ASSISTANT_TEMPLATE = """<svelte:options runes={true} />
 
 <script>
 \tlet text = $state("Hello world");
 \t
-\t$inspect(text).with((type, value) => {{
-\t\tif (type === "update") {{
-\t\t\tconsole.log(`{pattern}`);
-\t\t}}
-\t}});
+\t$inspect(text).with((type, value) => {
+\t\tif (type === "update") {
+\t\t\tconsole.log(`%s`);
+\t\t}
+\t});
 </script>
 
 <div>
 \t<input 
 \t\tdata-testid="text-input" 
 \t\ttype="text" 
-\t\tbind:value={{text}} 
+\t\tbind:value={text} 
 \t/>
 </div>"""
-            }
+
+# System message shared by every positive example
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Template for generating training examples
+def generate_training_example(pattern, task_description):
+    return {
+        "messages": [
+            SYSTEM_MESSAGE,
+            {"role": "user", "content": USER_TEMPLATE % task_description},
+            {"role": "assistant", "content": ASSISTANT_TEMPLATE % pattern},
         ]
     }
 
-# Generate comprehensive dataset
-training_examples = []
-
 # Positive examples (correct syntax)
 patterns_tasks = [
     ("Text updated to: \"${value}\"", "logs text updates"),
@@ -66,33 +65,46 @@ patterns_tasks = [
     ("Counter is now: ${count}", "displays counter value"),
 ]
 
-for pattern, task in patterns_tasks:
-    training_examples.append(generate_training_example(pattern, task))
-
-# Negative examples (showing what NOT to do)
-negative_examples = [
+# Negative examples (showing what NOT to do), built once as a module constant
+NEGATIVE_EXAMPLES = (
     {
         "messages": [
-            {"role": "system", "content": "You are an expert Svelte 5 developer. Always use proper JavaScript syntax including backticks for template literals."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": "What's wrong with this code: console.log(Text updated: \"${value}\");"},
             {"role": "assistant", "content": "The issue is missing backticks around the template literal. Template literals in JavaScript MUST use backticks (`), not quotes or no quotes.\n\n❌ WRONG:\nconsole.log(Text updated: \"${value}\");\n\n✅ CORRECT:\nconsole.log(`Text updated: \"${value}\"`);\n\nWithout backticks, this causes a syntax error."}
         ]
     },
     {
         "messages": [
-            {"role": "system", "content": "You are an expert Svelte 5 developer. Always use proper JavaScript syntax including backticks for template literals."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": "Fix this broken template literal: console.log(The text is: ${text});"},
             {"role": "assistant", "content": "The template literal is missing backticks. Here's the fix:\n\n❌ WRONG:\nconsole.log(The text is: ${text});\n\n✅ CORRECT:\nconsole.log(`The text is: ${text}`);\n\nTemplate literals with ${} interpolation must be wrapped in backticks (`) to work correctly."}
         ]
-    }
-]
+    },
+)
 
-training_examples.extend(negative_examples)
+# Stream examples straight to disk instead of materializing the full dataset
+def iter_training_examples():
+    """Yield positive examples followed by the shared negative examples"""
+    return itertools.chain(itertools.starmap(generate_training_example, patterns_tasks), NEGATIVE_EXAMPLES)
 
-# Save training data
-with open('/Users/Abhijeet.Karpe/apps/svelte-bench/fine-tuning/comprehensive-training.jsonl', 'w') as f:
-    for example in training_examples:
-        f.write(json.dumps(example) + '\n')
+def open_training_output(path):
+    """Open a training data file for writing, zstd-compressing `.zst` paths"""
+    raw = open(path, 'wb', buffering=1 << 20)
+    if path.endswith('.zst'):
+        return zstd.ZstdCompressor(level=3, threads=-1).stream_writer(raw)
+    return raw
 
-print(f"Generated {len(training_examples)} training examples")
-print("Saved to: fine-tuning/comprehensive-training.jsonl")
\ No newline at end of file
+if __name__ == "__main__":
+    # Pass e.g. comprehensive-training.jsonl.zst to write a compressed corpus
+    output_path = sys.argv[1] if len(sys.argv) > 1 else '/Users/Abhijeet.Karpe/apps/svelte-bench/fine-tuning/comprehensive-training.jsonl'
+    
+    count = 0
+    with open_training_output(output_path) as f:
+        for example in iter_training_examples():
+            f.write(orjson.dumps(example))
+            f.write(b'\n')
+            count += 1
+    
+    print(f"Generated {count} training examples")
+    print(f"Saved to: {output_path}")
\ No newline at end of file
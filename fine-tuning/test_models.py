@@ -3,13 +3,39 @@
 Test fine-tuned models against the original failing cases
 """
 
+import asyncio
+import functools
+import httpx
+import hyperscan
 import json
+import numpy as np
 import openai
 import os
-from typing import List, Dict, Tuple
+import re
+from typing import List, Dict, Optional, Tuple
+
+# System prompt shared by every provider so prompt formats cannot drift apart
+SYSTEM_PROMPT = "You are an expert Svelte 5 developer. Always use proper JavaScript syntax including backticks for template literals."
+
+@functools.lru_cache(maxsize=4)
+def _load_local(model_id: str):
+    """Load a local tokenizer/model pair once and reuse it across test runs"""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    
+    tokenizer = AutoTokenizer.from_pretrained(model_id, use_fast=True)
+    # bf16 only where the GPU supports it; pre-Ampere GPUs and CPU load fp32
+    use_bf16 = torch.cuda.is_available() and torch.cuda.is_bf16_supported()
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        torch_dtype=torch.bfloat16 if use_bf16 else torch.float32,
+        device_map="auto"
+    )
+    return tokenizer, model
 
 class ModelTester:
-    def __init__(self):
+    def __init__(self, verbose: bool = True):
+        self.verbose = verbose
         self.test_cases = [
             {
                 "prompt": "Create a Svelte 5 component with $inspect that logs 'Text updated to: [value]' when text changes",
@@ -36,9 +62,60 @@ class ModelTester:
                 ]
             }
         ]
+        
+        # Precompile each case's patterns into a single Hyperscan database
+        for test_case in self.test_cases:
+            test_case['database'] = self._build_database(test_case)
+    
+    @staticmethod
+    def _build_database(test_case: Dict) -> Optional[hyperscan.Database]:
+        """Compile expected then forbidden patterns into one literal-match database"""
+        patterns = test_case['expected_patterns'] + test_case['forbidden_patterns']
+        
+        # Hyperscan rejects patterns that match empty input; an empty pattern is
+        # always a substring, so _evaluate_response counts those as hits instead
+        ids = [i for i, p in enumerate(patterns) if p]
+        if not ids:
+            return None
+        
+        database = hyperscan.Database()
+        database.compile(
+            expressions=[re.escape(patterns[i].encode('utf-8')) for i in ids],
+            ids=ids,
+            flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(ids)
+        )
+        return database
     
     def test_model(self, model_id: str, provider: str = "openai") -> Dict:
         """Test a model against all test cases"""
+        return asyncio.run(self._run_models([(model_id, provider)]))[0]
+    
+    async def _run_models(self, models: List[Tuple[str, str]]) -> List[Dict]:
+        """Test models concurrently, sharing one pooled API client and rate limit for the run"""
+        # Bound in-flight requests across all models to respect provider rate limits
+        semaphore = asyncio.Semaphore(8)
+        
+        # One lock per local model: loading and generation on it are serialized
+        local_locks = {model_id: asyncio.Lock() for model_id, provider in models if provider == "local"}
+        
+        openai_client = None
+        if any(provider == "openai" for _, provider in models):
+            openai_client = self._create_openai_client()
+        
+        try:
+            return list(await asyncio.gather(*(
+                self.test_model_async(model_id, provider, semaphore, openai_client, local_locks.get(model_id))
+                for model_id, provider in models
+            )))
+        finally:
+            # The client's connection pool lives only as long as this event loop
+            if openai_client is not None:
+                await openai_client.close()
+    
+    async def test_model_async(self, model_id: str, provider: str, semaphore: asyncio.Semaphore,
+                               openai_client: Optional[openai.AsyncOpenAI] = None,
+                               local_lock: Optional[asyncio.Lock] = None) -> Dict:
+        """Test a model against all test cases, issuing requests concurrently"""
         results = {
             "model_id": model_id,
             "provider": provider,
@@ -46,17 +123,43 @@ class ModelTester:
             "overall_score": 0
         }
         
-        for i, test_case in enumerate(self.test_cases):
-            print(f"Testing case {i+1}: {test_case['prompt'][:50]}...")
+        # Cases of a local model share one lock even when called directly
+        local_lock = local_lock or asyncio.Lock()
+        
+        async def generate(prompt: str) -> str:
+            # Local models hit no remote API, so they wait on their own lock
+            # instead of holding rate-limit permits
+            if provider == "local":
+                return await self._test_local_model(local_lock, model_id, prompt)
             
-            try:
-                # Generate response
+            async with semaphore:
                 if provider == "openai":
-                    response = self._test_openai_model(model_id, test_case['prompt'])
+                    return await self._test_openai_model(openai_client, model_id, prompt)
                 elif provider == "gemini":
-                    response = self._test_gemini_model(model_id, test_case['prompt'])
+                    return await self._test_gemini_model(model_id, prompt)
                 else:
-                    response = "Provider not supported"
+                    return "Provider not supported"
+        
+        for i, test_case in enumerate(self.test_cases):
+            print(f"[{model_id}] Testing case {i+1}: {test_case['prompt'][:50]}...")
+        
+        responses = await asyncio.gather(
+            *(generate(test_case['prompt']) for test_case in self.test_cases),
+            return_exceptions=True
+        )
+        
+        # Report this model's results as one uninterrupted block
+        print(f"\n{'='*50}")
+        print(f"Testing {provider}: {model_id}")
+        print('='*50)
+        
+        for i, (test_case, response) in enumerate(zip(self.test_cases, responses)):
+            print(f"Results for case {i+1}:")
+            
+            try:
+                # Surface request errors captured by gather
+                if isinstance(response, Exception):
+                    raise response
                 
                 # Evaluate response
                 score = self._evaluate_response(response, test_case)
@@ -85,14 +188,24 @@ class ModelTester:
         
         return results
     
-    def _test_openai_model(self, model_id: str, prompt: str) -> str:
+    @staticmethod
+    def _create_openai_client() -> openai.AsyncOpenAI:
+        """Create a pooled HTTP/2 OpenAI client; the caller must close it"""
+        return openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.AsyncClient(
+                http2=True,
+                timeout=60.0,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=32)
+            )
+        )
+    
+    async def _test_openai_model(self, client: openai.AsyncOpenAI, model_id: str, prompt: str) -> str:
         """Test OpenAI model"""
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=model_id,
             messages=[
-                {"role": "system", "content": "You are an expert Svelte 5 developer. Always use proper JavaScript syntax including backticks for template literals."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0
@@ -100,45 +213,69 @@ class ModelTester:
         
         return response.choices[0].message.content
     
-    def _test_gemini_model(self, model_id: str, prompt: str) -> str:
+    async def _test_local_model(self, lock: asyncio.Lock, model_id: str, prompt: str) -> str:
+        """Test a local Hugging Face model (e.g. ./svelte-inspect-fine-tuned)"""
+        # Same conversation format the local trainer uses
+        text = f"<|system|>\n{SYSTEM_PROMPT}\n<|user|>\n{prompt}\n<|assistant|>\n"
+        
+        def generate(tokenizer, model) -> str:
+            inputs = tokenizer(text, return_tensors="pt").to(model.device)
+            output = model.generate(**inputs, max_new_tokens=512, do_sample=False)
+            return tokenizer.decode(output[0][inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        
+        # Loading and generation block, so keep both off the event loop. The lock
+        # stops concurrent cases from loading the weights twice and from sharing
+        # the tokenizer/model across threads at the same time.
+        async with lock:
+            tokenizer, model = await asyncio.to_thread(_load_local, model_id)
+            return await asyncio.to_thread(generate, tokenizer, model)
+    
+    async def _test_gemini_model(self, model_id: str, prompt: str) -> str:
         """Test Gemini model (placeholder)"""
         # Implementation would depend on Gemini API
         return "Gemini testing not implemented"
     
     def _evaluate_response(self, response: str, test_case: Dict) -> float:
         """Evaluate response quality"""
-        score = 0.0
-        total_checks = len(test_case['expected_patterns']) + len(test_case['forbidden_patterns'])
+        n_expected = len(test_case['expected_patterns'])
+        total_checks = n_expected + len(test_case['forbidden_patterns'])
+        if total_checks == 0:
+            return 0.0
         
-        # Check for expected patterns
-        for pattern in test_case['expected_patterns']:
-            if pattern in response:
-                score += 1.0
-            else:
-                print(f"    Missing expected: {pattern}")
+        # Find all expected and forbidden patterns in one scan
+        hits = np.array(
+            [not p for p in test_case['expected_patterns'] + test_case['forbidden_patterns']],
+            dtype=bool
+        )
+        if test_case['database'] is not None:
+            test_case['database'].scan(
+                response.encode('utf-8', 'ignore'),
+                match_event_handler=lambda id, *_: hits.__setitem__(id, True)
+            )
+        
+        # Expected patterns add to the score, forbidden patterns penalize
+        score = float(hits[:n_expected].sum()) - float(hits[n_expected:].sum())
         
-        # Check for forbidden patterns (penalize)
-        for pattern in test_case['forbidden_patterns']:
-            if pattern in response:
-                score -= 1.0
-                print(f"    Found forbidden: {pattern}")
+        if self.verbose:
+            for i in np.flatnonzero(~hits[:n_expected]):
+                print(f"    Missing expected: {test_case['expected_patterns'][i]}")
+            for i in np.flatnonzero(hits[n_expected:]):
+                print(f"    Found forbidden: {test_case['forbidden_patterns'][i]}")
         
-        return max(0.0, score / total_checks) if total_checks > 0 else 0.0
+        return max(0.0, score / total_checks)
     
     def compare_models(self, models: List[Tuple[str, str]]) -> Dict:
         """Compare multiple models"""
+        return asyncio.run(self._compare_models_async(models))
+    
+    async def _compare_models_async(self, models: List[Tuple[str, str]]) -> Dict:
         comparison = {
             "models": [],
             "summary": {}
         }
         
-        for model_id, provider in models:
-            print(f"\n{'='*50}")
-            print(f"Testing {provider}: {model_id}")
-            print('='*50)
-            
-            results = self.test_model(model_id, provider)
-            comparison["models"].append(results)
+        # Models are independent, so test them all concurrently
+        comparison["models"] = await self._run_models(models)
         
         # Generate summary
         comparison["summary"] = {
@@ -161,6 +298,7 @@ def main():
     models_to_test = [
         ("gpt-3.5-turbo", "openai"),  # Baseline
         # ("ft:gpt-3.5-turbo:your-org:svelte-inspect:xyz", "openai"),  # Fine-tuned
+        # ("./svelte-inspect-fine-tuned", "local"),  # Local fine-tuned
     ]
     
     print("🧪 Starting model comparison...")